@@ -1,5 +1,76 @@
 import pandas as pd
 import numpy as np
+from utils import resolve_schema
+
+# Number of products charted on the dashboard and listed in the PDF report
+TOP_PRODUCTS = 10
+
+# Optional Numba kernel for the high-value transaction count. Below this many
+# rows the JIT dispatch costs more than the plain NumPy comparison saves.
+NUMBA_MIN_ROWS = 1_000_000
+# Compiled on first need (see _get_count_above_jit) so importing numba doesn't
+# slow every cold start; False once the import has failed
+_count_above_jit = None
+
+def _get_count_above_jit():
+    global _count_above_jit
+    if _count_above_jit is None:
+        try:
+            import numba
+
+            @numba.njit(parallel=True, cache=True)
+            def count_above_jit(a, threshold):
+                count = 0
+                for i in numba.prange(a.size):
+                    if a[i] > threshold:
+                        count += 1
+                return count
+            _count_above_jit = count_above_jit
+        except Exception:
+            _count_above_jit = False
+    return _count_above_jit
+
+def to_rupees(values):
+    """Rounds amounts to paise as plain Python floats, hiding float32 storage noise."""
+    return np.round(np.asarray(values, dtype=np.float64), 2).tolist()
+
+def count_above(amounts, threshold):
+    """Counts values strictly greater than threshold in one pass over the array."""
+    if amounts.size >= NUMBA_MIN_ROWS:
+        count_above_jit = _get_count_above_jit()
+        if count_above_jit:
+            return int(count_above_jit(amounts, threshold))
+    return int(np.count_nonzero(amounts > threshold))
+
+def parse_dates(col):
+    """
+    Converts a date column to datetimes (NaT where unparseable).
+    Tries pandas' native ISO8601 parser first and only falls back to
+    per-format inference when some values are not ISO formatted.
+    """
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    if col.dtype == object or pd.api.types.is_string_dtype(col):
+        dates = pd.to_datetime(col, format='ISO8601', errors='coerce')
+        if dates.notna().sum() == col.notna().sum():
+            return dates
+    return pd.to_datetime(col, errors='coerce')
+
+def _date_order(df):
+    """
+    Returns the row positions of df in date order (stable, rows with
+    unparseable dates dropped), or None when there is no usable date column.
+    Only the date column is read; the frame is not copied.
+    """
+    date_col = resolve_schema(tuple(df.columns))['date']
+    if not date_col:
+        return None
+    try:
+        dates = parse_dates(df[date_col])
+        valid = dates.notna().values
+        return np.flatnonzero(valid)[dates[valid].values.argsort(kind='stable')]
+    except (ValueError, TypeError):
+        return None
 
 def generate_insights(df, revenue):
     """Generates AI-style narrative insights."""
@@ -10,14 +81,16 @@ def generate_insights(df, revenue):
 
     # 2. Top Product Insight (Robust Check)
     # Find product column using keywords
-    prod_col = next((c for c in df.columns if any(k in c.lower() for k in ['product', 'item', 'description'])), None)
+    prod_col = resolve_schema(tuple(df.columns))['prod']
     amt_col = 'amount' # We standardized this in app.py
     
     if prod_col and amt_col in df.columns:
         # Check if amount is numeric
         if pd.api.types.is_numeric_dtype(df[amt_col]):
-            top_prod = df.groupby(prod_col)[amt_col].sum().idxmax()
-            top_val = df.groupby(prod_col)[amt_col].sum().max()
+            # Group once and reuse; the group index order is irrelevant here
+            product_sales = df.groupby(prod_col, sort=False, observed=True)[amt_col].sum()
+            top_prod = product_sales.idxmax()
+            top_val = product_sales.max()
             if revenue > 0:
                 share = (top_val / revenue) * 100
                 insights.append(f"Top Performer: '{top_prod}' contributes {share:.1f}% of total sales.")
@@ -26,52 +99,52 @@ def generate_insights(df, revenue):
 
     # 3. Anomaly / High Value Transactions
     if 'amount' in df.columns and pd.api.types.is_numeric_dtype(df['amount']):
-        avg_txn = df['amount'].mean()
+        # Single read of the amount array: revenue is already its sum, and
+        # count_above avoids materializing a filtered DataFrame copy.
+        amounts = df['amount'].to_numpy(dtype=np.float64)
+        avg_txn = revenue / amounts.size if amounts.size else 0.0
         if avg_txn > 0:
-            high_count = df[df['amount'] > 2 * avg_txn].shape[0]
+            high_count = count_above(amounts, 2 * avg_txn)
             if high_count > 0:
                 insights.append(f"Detected {high_count} transactions significantly higher than the average ticket size (₹{avg_txn:.2f}).")
 
     return insights
 
-def forecast_sales(df):
+def forecast_sales(df, order=None):
     """
     Predicts next period sales using Linear Regression (switched to numpy for performance).
     Requires a date column. If no date, uses index as proxy for time.
+    `order` is the date ordering from _date_order, computed here if not given.
     """
     if 'amount' not in df.columns:
         return 0.0
 
-    # Try to find a date column
-    date_col = next((c for c in df.columns if any(k in c.lower() for k in ['date', 'time', 'day'])), None)
-    
-    data = df.copy()
-    
-    # Preprocessing
-    if date_col:
-        try:
-            data[date_col] = pd.to_datetime(data[date_col], errors='coerce')
-            data = data.dropna(subset=[date_col])
-            data = data.sort_values(date_col)
-        except:
-            pass 
+    if order is None:
+        order = _date_order(df)
 
     # Prepare X (Time) and y (Sales)
     # Use index as time proxy
     try:
-        y = pd.to_numeric(data['amount'], errors='coerce').fillna(0).values
-        x = np.arange(len(y))  # 0, 1, 2, ...
-        
-        if len(y) < 2:
+        y = pd.to_numeric(df['amount'], errors='coerce').fillna(0).values
+        if order is not None:
+            y = y[order]
+        n = len(y)
+
+        if n < 2:
             return 0.0
 
-        # Replace sklearn.linear_model.LinearRegression with numpy.polyfit
-        # Degree 1 = Linear (mx + c)
-        slope, intercept = np.polyfit(x, y, 1)
-        
+        # Closed-form least squares for y = mx + c with x = 0, 1, 2, ...
+        # mean(x) and sum((x - mean(x))^2) are known analytically for arange,
+        # so no Vandermonde matrix / SVD (np.polyfit) is needed.
+        x_mean = (n - 1) / 2.0
+        y_mean = y.mean()
+        sxy = (y * (np.arange(n) - x_mean)).sum()
+        sxx = n * (n * n - 1) / 12.0
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+
         # Predict next step
-        next_index = len(y)
-        prediction = (slope * next_index) + intercept
+        prediction = (slope * n) + intercept
         
         return max(0.0, prediction) 
     except:
@@ -83,32 +156,40 @@ def generate_dashboard_data(df):
     a single dictionary for the dashboard UI.
     """
     # 1. Identify key columns consistent with existing logic
-    prod_col = next((c for c in df.columns if any(k in c.lower() for k in ['product', 'item', 'description'])), None)
+    prod_col = resolve_schema(tuple(df.columns))['prod']
     
     # 2. KPI Metrics
-    total_revenue = float(df['amount'].sum()) if 'amount' in df.columns else 0.0
+    # Amounts are stored as float32; accumulate the total in float64 and
+    # round what is displayed to paise to hide float32 storage noise
+    revenue_sum = float(df['amount'].to_numpy().sum(dtype=np.float64)) if 'amount' in df.columns else 0.0
+    total_revenue = round(revenue_sum, 2)
     total_orders = int(len(df))
-    avg_order_value = total_revenue / total_orders if total_orders > 0 else 0.0
+    avg_order_value = revenue_sum / total_orders if total_orders > 0 else 0.0
     unique_products = int(df[prod_col].nunique()) if prod_col else 0
     
     # 3. Chart Data
-    # Sales by Product
+    # Sales by Product (top products only, best first)
     sales_by_product = {}
     if prod_col and 'amount' in df.columns:
-        sales_by_product = df.groupby(prod_col)['amount'].sum().sort_values(ascending=False).to_dict()
+        product_sales = df.groupby(prod_col, sort=False, observed=True)['amount'].sum()
+        totals = product_sales.to_numpy(dtype=np.float64)
+        # O(G) partial selection instead of sorting every group
+        if len(totals) > TOP_PRODUCTS:
+            top_idx = np.argpartition(-totals, TOP_PRODUCTS)[:TOP_PRODUCTS]
+        else:
+            top_idx = np.arange(len(totals))
+        top_idx = top_idx[np.argsort(-totals[top_idx], kind='stable')]
+        top_names = product_sales.index[top_idx].tolist()
+        sales_by_product = dict(zip(top_names, to_rupees(totals[top_idx])))
     
-    # Sales Trend (sorted by date if possible, otherwise index)
-    date_col = next((c for c in df.columns if any(k in c.lower() for k in ['date', 'time', 'day'])), None)
-    if date_col and 'amount' in df.columns:
-        try:
-            temp_df = df.copy()
-            temp_df[date_col] = pd.to_datetime(temp_df[date_col], errors='coerce')
-            temp_df = temp_df.dropna(subset=[date_col]).sort_values(date_col)
-            sales_trend = temp_df['amount'].tolist()
-        except:
-            sales_trend = df['amount'].tolist()
+    # Sales Trend (sorted by date if possible, otherwise index); the date
+    # order is computed once and shared with the forecast
+    order = _date_order(df)
+    if 'amount' in df.columns:
+        amounts = df['amount'].to_numpy()
+        sales_trend = to_rupees(amounts[order] if order is not None else amounts)
     else:
-        sales_trend = df['amount'].tolist() if 'amount' in df.columns else []
+        sales_trend = []
 
     # 4. Consolidate into final dictionary
     dashboard_data = {
@@ -118,8 +199,8 @@ def generate_dashboard_data(df):
         "unique_products": unique_products,
         "sales_by_product": sales_by_product,
         "sales_trend": sales_trend,
-        "next_sales_prediction": forecast_sales(df),
-        "insights": generate_insights(df, total_revenue)
+        "next_sales_prediction": forecast_sales(df, order),
+        "insights": generate_insights(df, revenue_sum)
     }
     
     return dashboard_data
@@ -1,39 +1,58 @@
 import os
-# VERCEL OPTIMIZATION: Set matplotlib config dir to /tmp to avoid font cache timeout
-os.environ['MPLCONFIGDIR'] = '/tmp/matplotlib'
-
-import datetime
+import atexit
+import base64
+import hashlib
+import json
+import multiprocessing
+import queue
+import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 import numpy as np
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, make_response, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask_compress import Compress
 from flask_dance.contrib.google import make_google_blueprint, google
 from io import BytesIO
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import google.generativeai as genai
 
 load_dotenv()
 
+# When the app is started with `python app.py`, the spawned report-pool
+# processes re-run this file as __mp_main__. They only need report.py, so
+# startup side effects (Gemini client, init_db) are skipped there.
+IS_REPORT_WORKER = __name__ == "__mp_main__"
+
 # Configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
+if GEMINI_API_KEY and not IS_REPORT_WORKER:
     genai.configure(api_key=GEMINI_API_KEY)
 
-# ReportLab imports for advanced PDF
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+# Built once and reused by every chat turn; capped output keeps replies quick
+GEMINI_MODEL = genai.GenerativeModel(
+    'gemini-1.5-flash',
+    generation_config={'max_output_tokens': 400, 'temperature': 0.4}
+) if GEMINI_API_KEY and not IS_REPORT_WORKER else None
 
 from analytics_engine import generate_insights, forecast_sales, generate_dashboard_data
+from report import downsample_trend, render_report_pdf
+from utils import MONEY_RE, resolve_schema
 
 # ---------------- CONFIGURATION ----------------
+# Copy-on-write: column selections and slices share buffers until written,
+# instead of pandas copying defensively (amount is already float32)
+pd.options.mode.copy_on_write = True
+
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "supersecretkey")
+# Compress text responses (dashboard HTML embeds the chart arrays); the PDF
+# download is not in the default mimetype list and is sent as-is
+Compress(app)
 
 # VERCEL COMPATIBILITY: Use /tmp for SQLite as the root filesystem is read-only
 if os.environ.get('VERCEL') == '1':
@@ -45,17 +64,140 @@ else:
 google_bp = make_google_blueprint(
     client_id=os.getenv("GOOGLE_CLIENT_ID"),
     client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    scope=["profile", "email"],
+    # openid: Google then returns an ID token carrying the email claim
+    scope=["openid", "profile", "email"],
     redirect_to="login_google"
 )
 # Using a unique prefix to avoid conflict with manual /login/google route
 app.register_blueprint(google_bp, url_prefix="/google-auth")
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# Bump when init_db gains a new table or migration
+SCHEMA_VERSION = 3
+
+# One long-lived connection per worker thread (see get_db_connection)
+_db_local = threading.local()
+
+def connect_db():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # WAL + NORMAL sync: far fewer fsyncs for the BLOB-heavy history inserts,
+    # and readers no longer block on a writer
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-20000')
+    # Memory-map up to 256 MB so history BLOB reads skip the read() copy
+    conn.execute('PRAGMA mmap_size=268435456')
     return conn
 
+def get_db_connection():
+    """
+    Returns this thread's SQLite connection, opening it on first use so the
+    page cache stays warm across requests. Callers must not close it.
+    """
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = _db_local.conn = connect_db()
+    return conn
+
+# Upload history is written by one background thread per process, which
+# commits queued rows in batches so upload requests never wait on an fsync.
+# Vercel freezes a function once it has responded, so writes stay inline there.
+HISTORY_BATCH_SIZE = 32
+HISTORY_BATCH_WAIT = 0.01
+# Rows carry whole files; past this many queued, uploads write inline instead
+HISTORY_QUEUE_MAX = 64
+HISTORY_RETRY_MAX_DELAY = 30
+HISTORY_FLUSH_TIMEOUT = 10
+INSERT_HISTORY_SQL = ('INSERT INTO upload_history (user_id, file_name, file_data, parquet_data, analysis_json) '
+                      'VALUES (?, ?, ?, ?, ?)')
+_history_queue = queue.Queue(maxsize=HISTORY_QUEUE_MAX)
+_history_writer = None
+_history_writer_lock = threading.Lock()
+
+def write_history_rows(conn, rows):
+    try:
+        conn.executemany(INSERT_HISTORY_SQL, rows)
+        conn.commit()
+        return
+    except Exception as db_err:
+        conn.rollback()
+        if len(rows) == 1:
+            print(f"Database Error: {db_err}")
+            return
+    # A batch mixes several users' uploads; retry row by row so one bad row
+    # doesn't take the others with it
+    for row in rows:
+        try:
+            conn.execute(INSERT_HISTORY_SQL, row)
+            conn.commit()
+        except Exception as db_err:
+            conn.rollback()
+            print(f"Database Error: {db_err}")
+
+def _drain_history_queue(rows, timeout):
+    """Adds queued rows to `rows` until the batch is full or nothing arrives within timeout."""
+    while len(rows) < HISTORY_BATCH_SIZE:
+        try:
+            rows.append(_history_queue.get(timeout=timeout) if timeout else _history_queue.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+def _history_writer_loop():
+    # Keep retrying the connection with backoff rather than dying (and being
+    # restarted on every upload); queued rows wait, bounded by HISTORY_QUEUE_MAX
+    conn, delay = None, 0.5
+    while conn is None:
+        try:
+            conn = connect_db()
+        except Exception as db_err:
+            print(f"Database Error: {db_err}")
+            time.sleep(delay)
+            delay = min(delay * 2, HISTORY_RETRY_MAX_DELAY)
+    while True:
+        rows = _drain_history_queue([_history_queue.get()], HISTORY_BATCH_WAIT)
+        try:
+            write_history_rows(conn, rows)
+        finally:
+            for _ in rows:
+                _history_queue.task_done()
+
+def save_history_rows(rows):
+    """Queues upload_history rows for the background writer (inline on Vercel or when the queue is full)."""
+    if os.environ.get('VERCEL') == '1':
+        write_history_rows(get_db_connection(), rows)
+        return
+    global _history_writer
+    with _history_writer_lock:
+        # Checked per call: a forked worker inherits the variable but not the thread
+        if _history_writer is None or not _history_writer.is_alive():
+            _history_writer = threading.Thread(target=_history_writer_loop, name="history-writer", daemon=True)
+            _history_writer.start()
+    for n, row in enumerate(rows):
+        try:
+            _history_queue.put_nowait(row)
+        except queue.Full:
+            write_history_rows(get_db_connection(), rows[n:])
+            return
+
+@atexit.register
+def _flush_history_queue():
+    # The writer is a daemon thread: give it time to finish the batch it holds
+    # and whatever is queued, then persist any leftovers here
+    if _history_writer is not None and _history_writer.is_alive():
+        waiter = threading.Thread(target=_history_queue.join, daemon=True)
+        waiter.start()
+        waiter.join(HISTORY_FLUSH_TIMEOUT)
+    rows = _drain_history_queue([], 0)
+    while rows:
+        conn = connect_db()
+        write_history_rows(conn, rows)
+        conn.close()
+        for _ in rows:
+            _history_queue.task_done()
+        rows = _drain_history_queue([], 0)
+
 def init_db():
     try:
         # Only try to create directories if we're not on Vercel or if we're in /tmp
@@ -66,104 +208,249 @@ def init_db():
             except OSError:
                 print(f"Warning: Could not create directory {db_dir}. This is expected on Vercel.")
 
-        conn = get_db_connection()
-        # Ensure user table exists with modern schema
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS user (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                login_type TEXT DEFAULT 'local'
-            )
-        ''')
-        # Add login_type if it doesn't exist (migration)
-        try:
-            conn.execute('ALTER TABLE user ADD COLUMN login_type TEXT DEFAULT "local"')
-        except sqlite3.OperationalError:
-            pass
-
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS upload_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                file_name TEXT,
-                file_data BLOB,
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Migration: add file_data if it doesn't exist
-        try:
-            conn.execute('ALTER TABLE upload_history ADD COLUMN file_data BLOB')
-        except sqlite3.OperationalError:
-            pass
+        # Own connection, closed below, so nothing is inherited by forked workers
+        conn = connect_db()
+        # Schema and migrations only run when the file predates SCHEMA_VERSION,
+        # so warm databases (and serverless cold starts) skip the ALTER attempts
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < SCHEMA_VERSION:
+            # Ensure user table exists with modern schema
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS user (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    login_type TEXT DEFAULT 'local'
+                )
+            ''')
+            # Add login_type if it doesn't exist (migration)
+            try:
+                conn.execute('ALTER TABLE user ADD COLUMN login_type TEXT DEFAULT "local"')
+            except sqlite3.OperationalError:
+                pass
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS upload_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    file_name TEXT,
+                    file_data BLOB,
+                    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Migration: add file_data if it doesn't exist
+            try:
+                conn.execute('ALTER TABLE upload_history ADD COLUMN file_data BLOB')
+            except sqlite3.OperationalError:
+                pass
+            # Migration: add parquet_data (cleaned DataFrame) if it doesn't exist
+            try:
+                conn.execute('ALTER TABLE upload_history ADD COLUMN parquet_data BLOB')
+            except sqlite3.OperationalError:
+                pass
+            # Migration: add analysis_json (dashboard payload) if it doesn't exist
+            try:
+                conn.execute('ALTER TABLE upload_history ADD COLUMN analysis_json TEXT')
+            except sqlite3.OperationalError:
+                pass
+            # The history page lists a user's uploads newest first; serve it from the index
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_user_time ON upload_history(user_id, upload_time DESC)')
+            conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
         conn.commit()
         conn.close()
     except Exception as e:
         print(f"Database Init Error: {e}")
 
 # Call init_db gracefully
-try:
-    init_db()
-except:
-    pass
+if not IS_REPORT_WORKER:
+    try:
+        init_db()
+    except:
+        pass
 # ---------------- UTILITY ----------------
-def clean_currency(value):
-    if isinstance(value, str):
-        return value.replace(",", "").replace("₹", "").replace("/-", "").strip()
-    return value
+def clean_currency(s):
+    """Strips thousands separators, rupee signs and '/-' suffixes from a string Series."""
+    return (s.str.replace(",", "", regex=False)
+             .str.replace("₹", "", regex=False)
+             .str.replace("/-", "", regex=False)
+             .str.strip())
+
+# Report inputs keyed by a hash of the analysed file bytes, so the PDF export
+# can reuse the analysis instead of round-tripping it through the form.
+# Shared by a worker's threads and cachetools isn't thread-safe: go through
+# cache_report_data / get_report_data, which hold the lock.
+ANALYSIS_CACHE = TTLCache(maxsize=64, ttl=900)
+_analysis_cache_lock = threading.Lock()
+
+def cache_report_data(report_key, data):
+    """Caches only what the PDF report uses, with the trend already downsampled."""
+    entry = {
+        "revenue": data["total_revenue"],
+        "forecast": round(data["next_sales_prediction"], 2),
+        "insights": data["insights"],
+        "top_products": list(data["sales_by_product"].keys()),
+        "top_sales": list(data["sales_by_product"].values()),
+        "trend": downsample_trend(data["sales_trend"]).tolist(),
+    }
+    with _analysis_cache_lock:
+        ANALYSIS_CACHE[report_key] = entry
+
+def get_report_data(report_key):
+    with _analysis_cache_lock:
+        return ANALYSIS_CACHE.get(report_key)
+
+# An empty or whitespace-only token in a '|'-separated list, with its separator
+EMPTY_TOKEN_RE = re.compile(r'(?:^|\|)\s*(?=\||$)')
+
+def parse_number_list(raw):
+    """
+    Parses a '|'-separated list of numbers from a form field, dropping empty
+    and non-numeric tokens. Well-formed input takes one C-level pass.
+    """
+    # np.fromstring stops at the first empty token (and reads a blank one as
+    # -1), so remove empty/blank tokens with their separators first
+    raw = EMPTY_TOKEN_RE.sub('', raw).strip('|')
+    if not raw:
+        return np.empty(0)
+    values = np.fromstring(raw, sep='|')
+    if values.size != raw.count('|') + 1:
+        # A token didn't parse: coerce each one and drop the failures
+        values = pd.to_numeric(pd.Series(raw.split('|')), errors='coerce').dropna().to_numpy(dtype=np.float64)
+    return values
+
+def content_key(*blobs):
+    h = hashlib.blake2b(digest_size=16)
+    for blob in blobs:
+        h.update(len(blob).to_bytes(8, "little"))
+        h.update(blob)
+    return h.hexdigest()
+
+def numeric_array(col):
+    """Coerces a column to a writable float32 NumPy array, NaN where a value isn't numeric."""
+    values = pd.to_numeric(col, errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+    # Under copy-on-write a float32 column comes back as a read-only view
+    return np.require(values, requirements="W")
 
 def process_file_stream(file_stream, filename):
     ext = os.path.splitext(filename)[1].lower()
     
     if ext == '.csv':
-        df = pd.read_csv(file_stream)
-    elif ext == '.xlsx':
-        df = pd.read_excel(file_stream, engine='openpyxl')
-    elif ext == '.xls':
-        df = pd.read_excel(file_stream, engine='xlrd')
+        # Arrow's multithreaded parser; the C engine handles anything it rejects
+        try:
+            df = pd.read_csv(file_stream, engine='pyarrow', dtype_backend='pyarrow')
+        except Exception:
+            file_stream.seek(0)
+            df = pd.read_csv(file_stream)
     else:
-        # Fallback
-        df = pd.read_excel(file_stream) 
+        # Rust-backed calamine reader (xlsx, xls, xlsm, xlsb, ods); the
+        # pure-Python engines stay as fallbacks
+        try:
+            df = pd.read_excel(file_stream, engine='calamine')
+        except Exception:
+            file_stream.seek(0)
+            df = pd.read_excel(file_stream, engine={'.xlsx': 'openpyxl', '.xls': 'xlrd'}.get(ext))
         
     df.columns = df.columns.str.lower()
     
     # 1. Clean Numeric
-    for col in df.columns:
-        if df[col].dtype == object:
-             df[col] = df[col].apply(clean_currency)
+    # Pure-text columns move to Arrow-backed strings so the cleaning runs on
+    # Arrow compute kernels; mixed columns only clean their string cells.
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        s = df[col]
+        if s.dtype == object:
+            kind = pd.api.types.infer_dtype(s, skipna=True)
+            if kind == "string":
+                df[col] = clean_currency(s.astype("string[pyarrow]"))
+            elif kind in ("mixed", "mixed-integer"):
+                # .str yields NaN for non-string cells; keep the original value there
+                cleaned = clean_currency(s)
+                df[col] = s.where(cleaned.isna(), cleaned)
+        elif pd.api.types.is_string_dtype(s):
+            # Already Arrow-backed text (pyarrow CSV reader). All-blank columns
+            # come back as null[pyarrow], which has no .str accessor; skip them.
+            df[col] = clean_currency(s)
 
     # 2. Detect Columns
-    def get_col(keywords):
-        for col in df.columns:
-            if any(k in col for k in keywords):
-                return col
-        return None
-
-    prod_col = get_col(["product", "item", "description", "particular"])
-    qty_col = get_col(["qty", "quantity", "units", "nos"])
-    rate_col = get_col(["rate", "price"])
-    amt_col = get_col(["amount", "total", "value", "net"])
-    date_col = get_col(["date", "time", "day"])
+    schema = resolve_schema(tuple(df.columns))
+    prod_col = schema["prod"]
+    qty_col = schema["qty"]
+    rate_col = schema["rate"]
+    amt_col = schema["amt"]
+    date_col = schema["date"]
 
     # 3. Resolve Amount
-    # ... (Rest of logic remains identical)
-    if amt_col:
-        df["amount"] = pd.to_numeric(df[amt_col], errors="coerce").fillna(0)
-    elif qty_col and rate_col:
-        df["amount"] = (pd.to_numeric(df[qty_col], errors="coerce") * pd.to_numeric(df[rate_col], errors="coerce")).fillna(0)
+    # Stored as float32 to halve memory traffic in the groupby/sum/sort work
+    # downstream. Relative error is ~1e-7, i.e. paise-exact for per-row values
+    # under ~₹1e5; totals are accumulated in float64 by the analytics engine.
+    if amt_col or (qty_col and rate_col):
+        # One cast straight to a float32 array per source column; missing
+        # values are zeroed in place instead of via fillna copies
+        if amt_col:
+            amount = numeric_array(df[amt_col])
+        else:
+            amount = numeric_array(df[qty_col]) * numeric_array(df[rate_col])
+        amount[np.isnan(amount)] = 0
+        df["amount"] = amount
     else:
-        numeric_cols = df.select_dtypes(include=[np.number])
-        if not numeric_cols.empty:
-            df["amount"] = numeric_cols.sum(axis=1)
+        # Prefer money-like numeric columns so IDs, counts and profit aren't added
+        # into revenue (and wide sheets don't densify every numeric column);
+        # fall back to all numeric columns when none match
+        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        sum_cols = [c for c in numeric_cols if isinstance(c, str) and MONEY_RE.search(c)] or list(numeric_cols)
+        if sum_cols:
+            # Row sums as one matrix-vector product (BLAS) over a dense block; missing values count as 0
+            values = df[sum_cols].to_numpy(dtype=np.float64, na_value=0.0)
+            df["amount"] = (values @ np.ones(values.shape[1])).astype(np.float32)
         else:
-             df["amount"] = 0
+             df["amount"] = np.float32(0)
 
     if not prod_col:
         df["product"] = "Unknown Item"
         prod_col = "product"
+
+    # Integer category codes make every downstream groupby/nunique on products cheap
+    df[prod_col] = df[prod_col].astype("category")
     
     return df, prod_col, qty_col, date_col
 
+def frame_to_parquet(df):
+    """Serializes a processed DataFrame for upload_history (None if Parquet can't hold its columns)."""
+    try:
+        buffer = BytesIO()
+        df.to_parquet(buffer, compression='zstd')
+        return buffer.getvalue()
+    except Exception:
+        return None
+
+def load_history_frame(item):
+    """Returns the processed DataFrame for an upload_history row, re-parsing the raw file only if no Parquet copy exists."""
+    if item['parquet_data']:
+        return pd.read_parquet(BytesIO(item['parquet_data']))
+    df, _, _, _ = process_file_stream(BytesIO(item['file_data']), item['file_name'])
+    return df
+
+def parallel_map(fn, items):
+    """Maps fn over items on a thread pool (the parsers release the GIL); a single item runs inline."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(8, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+def merge_frames(dfs):
+    """
+    Concatenates processed frames. Categorical columns shared by every frame
+    get one common category set first, so pd.concat keeps them as integer
+    codes instead of falling back to boxed Python objects.
+    """
+    if len(dfs) == 1:
+        return dfs[0]
+    shared = set.intersection(*(set(df.select_dtypes('category').columns) for df in dfs))
+    for col in shared:
+        categories = pd.Index(pd.unique(np.concatenate([df[col].cat.categories.astype(object) for df in dfs])))
+        for df in dfs:
+            df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(dfs, ignore_index=True)
+
 # ---------------- ROUTES ----------------
 
 @app.route("/", methods=["GET", "POST"])
@@ -175,40 +462,49 @@ def dashboard():
             return render_template("upload.html", error="No files selected.")
             
         try:
-            all_dfs = []
             curr_user_id = session.get('user_id', 1)
             
-            for file in files:
-                # Process each file directly from memory
-                df, _, _, _ = process_file_stream(file, file.filename)
-                all_dfs.append(df)
-                
-                # SAVE HISTORY: Insert record for each file
-                file.seek(0)
-                file_bytes = file.read()
-                try:
-                    conn = get_db_connection()
-                    conn.execute('INSERT INTO upload_history (user_id, file_name, file_data) VALUES (?, ?, ?)',
-                                (curr_user_id, file.filename, file_bytes))
-                    conn.commit()
-                    conn.close()
-                except Exception as db_err:
-                    print(f"Database Error: {db_err}")
+            # Read each upload once; parse and history both use these bytes
+            uploads = [(file.filename, file.read()) for file in files]
+            all_bytes = [file_bytes for _, file_bytes in uploads]
+
+            def parse_upload(upload):
+                filename, file_bytes = upload
+                df, _, _, _ = process_file_stream(BytesIO(file_bytes), filename)
+                return df, frame_to_parquet(df)
+
+            # Files are independent, so parse them concurrently
+            parsed = parallel_map(parse_upload, uploads)
+            all_dfs = [df for df, _ in parsed]
 
             if not all_dfs:
                 return render_template("upload.html", error="Could not process any of the uploaded files.")
 
             # MERGE ALL DATA: Concatenate all dataframes
-            merged_df = pd.concat(all_dfs, ignore_index=True)
+            merged_df = merge_frames(all_dfs)
             
             # Consolidate analytics using the merged data
             data = generate_dashboard_data(merged_df)
+            report_key = content_key(*all_bytes)
+            cache_report_data(report_key, data)
+
+            # SAVE HISTORY: One record per file, with the cleaned frame as
+            # Parquet so history views skip re-parsing. A single-file upload's
+            # analysis is that file's own, so store it too; multi-file records
+            # get theirs the first time they are viewed.
+            analysis_json = json.dumps(data, default=str) if len(uploads) == 1 else None
+            history_rows = [(curr_user_id, filename, file_bytes, parquet_bytes, analysis_json)
+                            for (filename, file_bytes), (_, parquet_bytes) in zip(uploads, parsed)]
+
+            save_history_rows(history_rows)
             
-            # Prepare data for charts
-            chart_labels = list(data['sales_by_product'].keys())[:10]
-            chart_data = list(data['sales_by_product'].values())[:10]
+            # Prepare data for charts (sales_by_product already holds only the top products)
+            chart_labels = list(data['sales_by_product'].keys())
+            chart_data = list(data['sales_by_product'].values())
 
-            # STORE IN SESSION: For AI Chat Assistant
+            # STORE IN SESSION: For AI Chat Assistant and the PDF report. Only
+            # small values go here (the session is a cookie); the full trend
+            # stays in ANALYSIS_CACHE under report_key.
             session['last_analysis'] = {
                 "kpis": {
                     "total_revenue": data["total_revenue"],
@@ -218,7 +514,10 @@ def dashboard():
                 },
                 "forecast": round(data["next_sales_prediction"], 2),
                 "insights": data["insights"],
-                "top_product": chart_labels[0] if chart_labels else "N/A"
+                "top_product": chart_labels[0] if chart_labels else "N/A",
+                "top_products": chart_labels,
+                "top_sales": chart_data,
+                "report_key": report_key
             }
 
             return render_template(
@@ -232,13 +531,26 @@ def dashboard():
                 insights=data["insights"],
                 revenue=data["total_revenue"],
                 chart_labels=chart_labels,
-                chart_data=chart_data
+                chart_data=chart_data,
+                report_key=report_key
             )
         except Exception as e:
             return render_template("upload.html", error=f"Collective Processing Error: {str(e)}")
 
     return render_template("upload.html")
 
+def id_token_claims(id_token):
+    """
+    Decodes the payload of a Google ID token. The token came straight from
+    Google's token endpoint over TLS, so (OIDC Core 3.1.3.7) its signature
+    needn't be re-verified here.
+    """
+    try:
+        payload = id_token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return {}
+
 @app.route("/login")
 def login():
     return render_template("login.html")
@@ -248,207 +560,133 @@ def login_google():
     if not google.authorized:
         return redirect(url_for("google.login"))
 
-    resp = google.get("/oauth2/v2/userinfo")
-    if not resp.ok:
-        return "Failed to fetch user info from Google", 400
-        
-    email = resp.json()["email"]
+    # The ID token already carries the email; only older tokens without one
+    # need the userinfo round-trip
+    id_token = (google.token or {}).get("id_token")
+    email = id_token_claims(id_token).get("email") if id_token else None
+    if not email:
+        resp = google.get("/oauth2/v2/userinfo")
+        if not resp.ok:
+            return "Failed to fetch user info from Google", 400
+        email = resp.json()["email"]
 
     session["user"] = email
     # Also set user_id for compatibility with other routes
     session["user_id"] = 1 # Placeholder for now as per previous context
     return redirect(url_for("dashboard"))
 
+# PDF rendering is CPU-bound pure Python, so it runs in a small process pool
+# (spawned lazily per worker) instead of holding the GIL on a request thread.
+# Vercel has no usable multiprocessing primitives, so it renders inline there.
+# Every gunicorn worker (WEB_CONCURRENCY, one per core by default) gets its own
+# pool, so the cores are split between them rather than each taking them all.
+REPORT_POOL_WORKERS = max(1, min(4, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))))
+_report_pool = None
+_report_pool_lock = threading.Lock()
+
+@atexit.register
+def _shutdown_report_pool():
+    if _report_pool is not None:
+        _report_pool.shutdown(wait=True, cancel_futures=True)
+
+def render_report(*args):
+    """Renders the PDF report via render_report_pdf, off-process where possible."""
+    if os.environ.get('VERCEL') == '1':
+        return render_report_pdf(*args)
+    global _report_pool
+    with _report_pool_lock:
+        if _report_pool is None:
+            # spawn, not fork: children don't inherit the app's threads or DB
+            # connections. Under gunicorn/WSGI they import only report.py; under
+            # `python app.py` they also re-run app.py (see IS_REPORT_WORKER).
+            _report_pool = ProcessPoolExecutor(max_workers=REPORT_POOL_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+        pool = _report_pool
+    try:
+        return pool.submit(render_report_pdf, *args).result()
+    except BrokenProcessPool as e:
+        # A worker died (e.g. OOM-killed); start a fresh pool next time
+        print(f"Report Pool Error: {e}")
+        with _report_pool_lock:
+            if _report_pool is pool:
+                _report_pool = None
+        return render_report_pdf(*args)
+
 @app.route("/download_report", methods=["POST"])
 def download_report():
-    # Retrieve data from form
-    revenue = request.form.get("revenue", "0")
-    forecast = request.form.get("forecast", "0")
-    
-    # Parse lists (custom separator | used in template)
-    insights_raw = request.form.get("insights", "")
-    insights = [i for i in insights_raw.split('|') if i.strip()]
-    
-    top_products_raw = request.form.get("top_products", "")
-    top_products = [p for p in top_products_raw.split('|') if p.strip()]
-    
-    top_sales_raw = request.form.get("top_sales", "")
-    top_sales = [float(s) if s.strip() else 0.0 for s in top_sales_raw.split('|') if s.strip()]
-
-    trend_raw = request.form.get("trend_data", "")
-    trend_data = [float(v) if v.strip() else 0.0 for v in trend_raw.split('|') if v.strip()]
-
-    # Setup PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=26,
-        textColor=colors.HexColor('#4318ff'),
-        spaceAfter=30,
-        alignment=1 # Center
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#1b254b'),
-        spaceBefore=25,
-        spaceAfter=15,
-        borderPadding=(0, 0, 8, 0),
-        borderColor=colors.HexColor('#e2e8f0'),
-        borderWidth=1,
-        borderBottom=True
-    )
-    
-    normal_style = styles["Normal"]
-    normal_style.fontSize = 11
-    normal_style.leading = 16
-    normal_style.textColor = colors.HexColor('#4a5568')
-
-    # Build Content
-    content = []
-    
-    # 1. Header
-    content.append(Paragraph("Strategic Business Intelligence Report", title_style))
-    content.append(Paragraph(f"AI ENGINE GENERATED ON: {datetime.datetime.now().strftime('%B %d, %Y | %H:%M')}", 
-                            ParagraphStyle('Sub', parent=normal_style, alignment=1, fontSize=9, textColor=colors.gray)))
-    content.append(Spacer(1, 30))
-    
-    # 2. Key Metrics Summary
-    content.append(Paragraph("Executive Performance Summary", heading_style))
-    data_metrics = [
-        ["Total Revenue Performance", "Predictive Revenue Forecast"],
-        [f"INR {revenue}", f"INR {forecast}"]
-    ]
-    t_metrics = Table(data_metrics, colWidths=[240, 240])
-    t_metrics.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f4f7fe')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#a3aed0')),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, 1), colors.white),
-        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 1), (-1, 1), 22),
-        ('TEXTCOLOR', (0, 1), (0, 1), colors.HexColor('#4318ff')), 
-        ('TEXTCOLOR', (1, 1), (1, 1), colors.HexColor('#01b574')), 
-        ('BOTTOMPADDING', (0, 1), (-1, 1), 15),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-    ]))
-    content.append(t_metrics)
-    content.append(Spacer(1, 40))
-
-    # 3. VISUAL CHARTS
-    content.append(Paragraph("Data Visualizations & Projections", heading_style))
-    
-    # Generate Bar Chart for Products
-    if top_products and top_sales:
-        chart_buffer = BytesIO()
-        plt.figure(figsize=(9, 4))
-        plt.bar(top_products[:5], top_sales[:5], color='#4318ff', alpha=0.8)
-        plt.title('Top 5 Performing Assets', fontsize=14, color='#1b254b', fontweight='bold')
-        plt.ylabel('Revenue (INR)', fontsize=10, color='#64748b')
-        plt.xticks(ha='center', fontsize=9)
-        plt.grid(axis='y', linestyle='--', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(chart_buffer, format='png', dpi=150)
-        plt.close()
-        chart_buffer.seek(0)
+    # Reuse the analysis cached at upload time when available
+    last_analysis = session.get("last_analysis") or {}
+    report_key = request.form.get("report_key") or last_analysis.get("report_key", "")
+    cached = get_report_data(report_key)
+    if cached:
+        revenue = cached["revenue"]
+        forecast = cached["forecast"]
+        insights = cached["insights"]
+        top_products = cached["top_products"]
+        top_sales = cached["top_sales"]
+        trend_data = cached["trend"]
+    else:
+        # Fallback: retrieve data from form
+        revenue = request.form.get("revenue", "0")
+        forecast = request.form.get("forecast", "0")
         
-        content.append(RLImage(chart_buffer, width=480, height=220))
-        content.append(Spacer(1, 20))
-
-    # Generate Line Chart for Trends
-    if trend_data:
-        trend_buffer = BytesIO()
-        plt.figure(figsize=(9, 4))
-        plt.plot(trend_data, color='#01b574', linewidth=3, marker='o', markersize=4, markerfacecolor='white')
-        plt.fill_between(range(len(trend_data)), trend_data, color='#01b574', alpha=0.05)
-        plt.title('Historical Revenue Trajectory', fontsize=14, color='#1b254b', fontweight='bold')
-        plt.xlabel('Cumulative Transaction Timeline', fontsize=9, color='#64748b')
-        plt.ylabel('Revenue (INR)', fontsize=9, color='#64748b')
-        plt.grid(axis='y', linestyle='--', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(trend_buffer, format='png', dpi=150)
-        plt.close()
-        trend_buffer.seek(0)
+        # Parse lists (custom separator | used in template)
+        insights_raw = request.form.get("insights", "")
+        insights = [i for i in insights_raw.split('|') if i.strip()]
         
-        content.append(RLImage(trend_buffer, width=480, height=220))
-        content.append(Spacer(1, 15))
+        if last_analysis.get("report_key") == report_key and "top_products" in last_analysis:
+            # Same analysis as the session's: its top products are already parsed
+            top_products = last_analysis["top_products"]
+            top_sales = last_analysis["top_sales"]
+        else:
+            top_products_raw = request.form.get("top_products", "")
+            top_products = [p for p in top_products_raw.split('|') if p.strip()]
 
-    content.append(Spacer(1, 40))
-    
-    # 4. AI Strategic Insights
-    content.append(Paragraph("AI-Driven Strategic Insights", heading_style))
-    for insight in insights:
-        content.append(Paragraph(f"<b>•</b> {insight}", normal_style))
-        content.append(Spacer(1, 6))
-        
-    content.append(Spacer(1, 30))
-    
-    # 5. Full Data Table
-    content.append(Paragraph("Detailed Performance Matrix", heading_style))
-    if top_products and top_sales:
-        table_data = [["Rank", "Strategic Asset / Product", "Revenue (INR)"]]
-        for i, (p, s) in enumerate(zip(top_products, top_sales), 1):
-            table_data.append([str(i), p, f"{s:,.2f}"])
-            
-        t = Table(table_data, colWidths=[50, 280, 150])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4318ff')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#1b254b')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.white),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f4f7fe')]),
-        ]))
-        content.append(t)
-    
-    # Build
-    doc.build(content)
-    
-    buffer.seek(0)
-    response = make_response(buffer.read())
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = "attachment; filename=AI_Strategic_Report.pdf"
-    return response
+            top_sales_raw = request.form.get("top_sales", "")
+            top_sales = parse_number_list(top_sales_raw)
+
+        trend_raw = request.form.get("trend_data", "")
+        # Reduced here, like the cached trend, so the report gets it ready to draw
+        trend_data = downsample_trend(parse_number_list(trend_raw)).tolist()
+
+    pdf_bytes = render_report(revenue, forecast, insights, top_products, top_sales, trend_data)
+    return send_file(BytesIO(pdf_bytes), mimetype="application/pdf", as_attachment=True,
+                     download_name="AI_Strategic_Report.pdf", max_age=0)
 
 # ---------------- AI CHAT ASSISTANT LOGIC ----------------
+# Keyword intents for the offline fallback, matched in one pass over the
+# question; when several match, the earlier intent in this list wins
+CHAT_INTENT_RE = re.compile(
+    r"(?P<revenue>revenue|sales)|(?P<forecast>forecast|predict)"
+    r"|(?P<top_product>top product|best seller)|(?P<greeting>hello|hi)",
+    re.IGNORECASE
+)
+CHAT_INTENT_PRIORITY = ("revenue", "forecast", "top_product", "greeting")
+
+def match_chat_intent(question):
+    found = {m.lastgroup for m in CHAT_INTENT_RE.finditer(question)}
+    return next((intent for intent in CHAT_INTENT_PRIORITY if intent in found), None)
+
 def generate_chat_response(question, data):
     if not GEMINI_API_KEY:
         # Fallback to simple logic if no API key
-        q = question.lower()
         if not data:
             return "Please upload and analyze a dataset first so I can help you with specific insights."
         
-        if "revenue" in q or "sales" in q:
+        intent = match_chat_intent(question)
+        if intent == "revenue":
             return f"The total revenue generated is ₹{data['kpis']['total_revenue']:,}. This is based on all processed transactions."
-        elif "forecast" in q or "predict" in q:
+        elif intent == "forecast":
             return f"Based on the current trend, our AI model forecasts sales for the next period to be approximately ₹{data['forecast']:,}."
-        elif "top product" in q or "best seller" in q:
+        elif intent == "top_product":
             return f"The top performing product is '{data['top_product']}', which has the highest revenue contribution in your dataset."
-        elif "hello" in q or "hi" in q:
+        elif intent == "greeting":
             return "Hello! I'm your AI Business Assistant. Since I don't have my advanced brain (Gemini) active yet, I can only answer specific questions about your data like revenue or forecasts. Add a GEMINI_API_KEY to see what I can really do!"
         else:
             return "I'm not quite sure about that. Try asking about 'revenue', 'forecast', or 'top product'."
 
     # Advanced Gemini Logic
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
         # Prepare context from analysis data (ChatGPT-like persona)
         if data:
             context = f"""
@@ -474,7 +712,7 @@ def generate_chat_response(question, data):
             context = "You are a versatile and friendly AI Assistant, similar to ChatGPT. You are ready to help with anything from general questions to creative writing. Note: The user hasn't uploaded business data yet, but you can still assist with general business advice or any other topic."
 
         prompt = f"{context}\n\nUser Question: {question}\nAI Response:"
-        response = model.generate_content(prompt)
+        response = GEMINI_MODEL.generate_content(prompt)
         return response.text
     except Exception as e:
         print(f"Gemini Error: {e}")
@@ -503,7 +741,6 @@ def history():
     conn = get_db_connection()
     history_data = conn.execute('SELECT id, file_name, upload_time FROM upload_history WHERE user_id = ? ORDER BY upload_time DESC',
                                 (user_id,)).fetchall()
-    conn.close()
     
     return render_template("history.html", history=history_data)
 
@@ -511,20 +748,31 @@ def history():
 def view_history_item(history_id):
     user_id = session.get('user_id', 1)
     conn = get_db_connection()
-    item = conn.execute('SELECT file_name, file_data FROM upload_history WHERE id = ? AND user_id = ?', 
+    item = conn.execute('SELECT file_name, file_data, parquet_data, analysis_json FROM upload_history WHERE id = ? AND user_id = ?', 
                         (history_id, user_id)).fetchone()
-    conn.close()
     
     if not item or not item['file_data']:
         return "Analysis data not found for this record.", 404
         
-    # Re-analyze from stored bytes
-    file_stream = BytesIO(item['file_data'])
-    df, _, _, _ = process_file_stream(file_stream, item['file_name'])
-    data = generate_dashboard_data(df)
+    if item['analysis_json']:
+        data = json.loads(item['analysis_json'])
+    else:
+        # Re-analyze from the stored frame (or raw bytes for older records)
+        # once, then keep the result so later views skip the work
+        df = load_history_frame(item)
+        data = generate_dashboard_data(df)
+        try:
+            conn.execute('UPDATE upload_history SET analysis_json = ? WHERE id = ?',
+                         (json.dumps(data, default=str), history_id))
+            conn.commit()
+        except Exception as db_err:
+            conn.rollback()
+            print(f"Database Error: {db_err}")
+    report_key = content_key(item['file_data'])
+    cache_report_data(report_key, data)
     
-    chart_labels = list(data['sales_by_product'].keys())[:10]
-    chart_data = list(data['sales_by_product'].values())[:10]
+    chart_labels = list(data['sales_by_product'].keys())
+    chart_data = list(data['sales_by_product'].values())
     
     return render_template(
         "dashboard.html",
@@ -537,7 +785,8 @@ def view_history_item(history_id):
         insights=data["insights"],
         revenue=data["total_revenue"],
         chart_labels=chart_labels,
-        chart_data=chart_data
+        chart_data=chart_data,
+        report_key=report_key
     )
 
 @app.route("/history/merge", methods=["POST"])
@@ -547,27 +796,30 @@ def merge_history():
         return redirect(url_for("history"))
         
     user_id = session.get('user_id', 1)
-    all_dfs = []
+    items = []
     
     conn = get_db_connection()
     for sid in selected_ids:
-        item = conn.execute('SELECT file_name, file_data FROM upload_history WHERE id = ? AND user_id = ?', 
+        item = conn.execute('SELECT file_name, file_data, parquet_data FROM upload_history WHERE id = ? AND user_id = ?', 
                             (sid, user_id)).fetchone()
         if item and item['file_data']:
-            file_stream = BytesIO(item['file_data'])
-            df, _, _, _ = process_file_stream(file_stream, item['file_name'])
-            all_dfs.append(df)
-    conn.close()
+            items.append(item)
+
+    # Load (or re-parse) the selected records concurrently
+    all_dfs = parallel_map(load_history_frame, items)
+    all_bytes = [item['file_data'] for item in items]
     
     if not all_dfs:
         return "No valid data found to merge.", 400
         
     # Merge all DataFrames
-    merged_df = pd.concat(all_dfs, ignore_index=True)
+    merged_df = merge_frames(all_dfs)
     data = generate_dashboard_data(merged_df)
+    report_key = content_key(*all_bytes)
+    cache_report_data(report_key, data)
     
-    chart_labels = list(data['sales_by_product'].keys())[:10]
-    chart_data = list(data['sales_by_product'].values())[:10]
+    chart_labels = list(data['sales_by_product'].keys())
+    chart_data = list(data['sales_by_product'].values())
     
     return render_template(
         "dashboard.html",
@@ -580,7 +832,8 @@ def merge_history():
         insights=data["insights"],
         revenue=data["total_revenue"],
         chart_labels=chart_labels,
-        chart_data=chart_data
+        chart_data=chart_data,
+        report_key=report_key
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,13 @@
+import multiprocessing
+import os
+
+# Production server settings, picked up automatically by `gunicorn`
+wsgi_app = "wsgi:application"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = 4
+# Import the app (pandas, NumPy, routes, init_db) once in the master and fork
+# workers from it: faster worker boot and shared read-only code pages.
+# Nothing at import opens threads or keeps a DB connection, so forking is safe.
+preload_app = True
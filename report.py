@@ -0,0 +1,250 @@
+import datetime
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+
+# Report charts are vector ReportLab drawings placed at this size (pt)
+REPORT_CHART_SIZE = (480, 220)
+# A trend line has no visible detail beyond ~1 point per pt of width, so
+# longer series are reduced to per-bucket min/max pairs before drawing
+REPORT_TREND_POINTS = 480
+
+def downsample_trend(values, max_points=REPORT_TREND_POINTS):
+    """
+    Reduces a series to at most max_points values, keeping each bucket's low
+    and high. Non-finite values are dropped (ReportLab can't scale an axis to NaN).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if values.size <= max_points:
+        return values
+    starts = np.linspace(0, values.size, max_points // 2, endpoint=False).astype(np.intp)
+    lows = np.minimum.reduceat(values, starts)
+    highs = np.maximum.reduceat(values, starts)
+    return np.column_stack([lows, highs]).ravel()
+
+def chart_drawing(title, chart, y_label):
+    """Wraps a ReportLab chart in a titled Drawing of REPORT_CHART_SIZE."""
+    from reportlab.graphics.shapes import Drawing, Group, String
+    from reportlab.lib import colors
+
+    width, height = REPORT_CHART_SIZE
+    drawing = Drawing(width, height)
+    chart.x, chart.y = 55, 35
+    chart.width, chart.height = width - 70, height - 70
+    chart.valueAxis.labels.fontName = 'Helvetica'
+    chart.valueAxis.labels.fontSize = 8
+    chart.valueAxis.labelTextFormat = lambda v: f"{v:,.0f}"
+    chart.valueAxis.visibleGrid = True
+    chart.valueAxis.gridStrokeColor = colors.HexColor('#e2e8f0')
+    chart.valueAxis.gridStrokeDashArray = (2, 2)
+    drawing.add(chart)
+    drawing.add(String(width / 2, height - 18, title, textAnchor='middle',
+                       fontName='Helvetica-Bold', fontSize=13, fillColor=colors.HexColor('#1b254b')))
+    # Rotated 90 degrees alongside the value axis
+    drawing.add(Group(String(0, 0, y_label, textAnchor='middle', fontName='Helvetica', fontSize=9, fillColor=colors.HexColor('#64748b')),
+                      transform=(0, 1, -1, 0, 10, chart.y + chart.height / 2)))
+    return drawing
+
+def build_product_chart(products, sales):
+    """Vector bar chart of the top products for the PDF report."""
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.lib import colors
+
+    chart = VerticalBarChart()
+    chart.data = [[float(v) for v in sales]]
+    chart.categoryAxis.categoryNames = [p if len(p) <= 18 else p[:17] + '…' for p in map(str, products)]
+    chart.categoryAxis.labels.fontName = 'Helvetica'
+    chart.categoryAxis.labels.fontSize = 8
+    chart.categoryAxis.labels.boxAnchor = 'n'
+    chart.valueAxis.valueMin = 0
+    chart.bars[0].fillColor = colors.HexColor('#4318ff')
+    chart.bars[0].strokeColor = None
+    chart.barWidth = 10
+    chart.groupSpacing = 12
+    return chart_drawing('Top 5 Performing Assets', chart, 'Revenue (INR)')
+
+def build_trend_chart(points):
+    """Vector line chart of the revenue trend, already reduced by downsample_trend."""
+    from reportlab.graphics.charts.linecharts import HorizontalLineChart
+    from reportlab.graphics.widgets.markers import makeMarker
+    from reportlab.lib import colors
+
+    points = np.asarray(points, dtype=np.float64)
+    chart = HorizontalLineChart()
+    chart.data = [points.tolist()]
+    chart.joinedLines = 1
+    chart.lines[0].strokeColor = colors.HexColor('#01b574')
+    # Markers and a heavier line only while individual points are distinguishable
+    chart.lines[0].strokeWidth = 2 if points.size <= 60 else 0.75
+    if points.size <= 60:
+        chart.lines[0].symbol = makeMarker('FilledCircle', size=4, fillColor=colors.white,
+                                           strokeColor=colors.HexColor('#01b574'))
+    chart.categoryAxis.visibleTicks = 0
+    chart.categoryAxis.labels.fontSize = 0
+    chart.categoryAxis.categoryNames = [''] * points.size
+    return chart_drawing('Historical Revenue Trajectory', chart, 'Revenue (INR)')
+
+@lru_cache(maxsize=None)
+def get_report_styles():
+    """Builds the PDF paragraph styles once per process."""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    styles = getSampleStyleSheet()
+    
+    # Custom Styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=26,
+        textColor=colors.HexColor('#4318ff'),
+        spaceAfter=30,
+        alignment=1 # Center
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#1b254b'),
+        spaceBefore=25,
+        spaceAfter=15,
+        borderPadding=(0, 0, 8, 0),
+        borderColor=colors.HexColor('#e2e8f0'),
+        borderWidth=1,
+        borderBottom=True
+    )
+    
+    normal_style = styles["Normal"]
+    normal_style.fontSize = 11
+    normal_style.leading = 16
+    normal_style.textColor = colors.HexColor('#4a5568')
+
+    subtitle_style = ParagraphStyle('Sub', parent=normal_style, alignment=1, fontSize=9, textColor=colors.gray)
+
+    return title_style, heading_style, normal_style, subtitle_style
+
+@lru_cache(maxsize=None)
+def get_report_table_styles():
+    """Builds the metrics, insights and products TableStyles once per process."""
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    metrics_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f4f7fe')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#a3aed0')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, 1), colors.white),
+        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 1), (-1, 1), 22),
+        ('TEXTCOLOR', (0, 1), (0, 1), colors.HexColor('#4318ff')), 
+        ('TEXTCOLOR', (1, 1), (1, 1), colors.HexColor('#01b574')), 
+        ('BOTTOMPADDING', (0, 1), (-1, 1), 15),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+    ])
+
+    insights_table_style = TableStyle([
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ])
+
+    products_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4318ff')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#1b254b')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.white),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f4f7fe')]),
+    ])
+
+    return metrics_table_style, insights_table_style, products_table_style
+
+def render_report_pdf(revenue, forecast, insights, top_products, top_sales, trend_data):
+    """
+    Renders the strategic report and returns the PDF bytes. Only plain values
+    go in and out, so it can run in a worker process. trend_data must already
+    be reduced by downsample_trend (callers do it where the data comes in).
+    """
+    # PDF libraries load on the first report instead of at cold start
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+
+    # Setup PDF
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+    title_style, heading_style, normal_style, subtitle_style = get_report_styles()
+    metrics_table_style, insights_table_style, products_table_style = get_report_table_styles()
+
+    # Build Content
+    content = []
+    
+    # 1. Header
+    content.append(Paragraph("Strategic Business Intelligence Report", title_style))
+    content.append(Paragraph(f"AI ENGINE GENERATED ON: {datetime.datetime.now().strftime('%B %d, %Y | %H:%M')}", 
+                            subtitle_style))
+    content.append(Spacer(1, 30))
+    
+    # 2. Key Metrics Summary
+    content.append(Paragraph("Executive Performance Summary", heading_style))
+    data_metrics = [
+        ["Total Revenue Performance", "Predictive Revenue Forecast"],
+        [f"INR {revenue}", f"INR {forecast}"]
+    ]
+    t_metrics = Table(data_metrics, colWidths=[240, 240])
+    t_metrics.setStyle(metrics_table_style)
+    content.append(t_metrics)
+    content.append(Spacer(1, 40))
+
+    # 3. VISUAL CHARTS
+    content.append(Paragraph("Data Visualizations & Projections", heading_style))
+    
+    # Vector charts drawn straight into the PDF (no rasterising or PNG encode).
+    # Non-finite values are left out: ReportLab can't scale an axis to NaN.
+    chart_products = [(p, float(v)) for p, v in zip(top_products[:5], top_sales[:5]) if np.isfinite(v)]
+    if chart_products:
+        content.append(build_product_chart(*zip(*chart_products)))
+        content.append(Spacer(1, 20))
+
+    if len(trend_data):
+        content.append(build_trend_chart(trend_data))
+        content.append(Spacer(1, 15))
+
+    content.append(Spacer(1, 40))
+    
+    # 4. AI Strategic Insights
+    content.append(Paragraph("AI-Driven Strategic Insights", heading_style))
+    if insights:
+        # One table flowable for all bullets instead of a Paragraph + Spacer pair each
+        t_insights = Table([[Paragraph(f"<b>•</b> {insight}", normal_style)] for insight in insights], colWidths=[480])
+        t_insights.setStyle(insights_table_style)
+        content.append(t_insights)
+        
+    content.append(Spacer(1, 30))
+    
+    # 5. Full Data Table
+    content.append(Paragraph("Detailed Performance Matrix", heading_style))
+    if top_products and len(top_sales):
+        table_data = [["Rank", "Strategic Asset / Product", "Revenue (INR)"]]
+        for i, (p, s) in enumerate(zip(top_products, top_sales), 1):
+            table_data.append([str(i), p, f"{s:,.2f}"])
+            
+        t = Table(table_data, colWidths=[50, 280, 150])
+        t.setStyle(products_table_style)
+        content.append(t)
+    
+    # Build
+    doc.build(content)
+    return buffer.getvalue()
@@ -0,0 +1,27 @@
+import re
+from functools import lru_cache
+
+# Column-detection keywords, compiled once as a single alternation per category
+KEYWORDS = {
+    "prod": re.compile(r"product|item|description|particular", re.IGNORECASE),
+    "qty": re.compile(r"qty|quantity|units|nos", re.IGNORECASE),
+    "rate": re.compile(r"rate|price", re.IGNORECASE),
+    "amt": re.compile(r"amount|total|value|net", re.IGNORECASE),
+    "date": re.compile(r"date|time|day", re.IGNORECASE),
+}
+
+# Money-like numeric columns, summed into the amount when no amount or qty x rate columns exist
+MONEY_RE = re.compile(r"sale|amt|revenue|total|val", re.IGNORECASE)
+
+def find_column(columns, pattern):
+    """Returns the first column whose name matches the keyword pattern, or None."""
+    return next((c for c in columns if isinstance(c, str) and pattern.search(c)), None)
+
+@lru_cache(maxsize=256)
+def resolve_schema(columns):
+    """
+    Maps each KEYWORDS category to its detected column name (or None).
+    Takes the headers as a tuple so repeated uploads with the same layout
+    skip detection entirely. The returned dict is shared; do not mutate it.
+    """
+    return {key: find_column(columns, pattern) for key, pattern in KEYWORDS.items()}
@@ -0,0 +1,4 @@
+# WSGI entry point for production servers: `gunicorn wsgi:application`
+from app import app
+
+application = app